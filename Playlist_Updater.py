@@ -1,293 +1,563 @@
 import requests
 import re
-import gzip
-import xml.etree.ElementTree as ET
-from urllib.parse import urlparse
-from typing import Dict, List, Tuple, Optional, Set
-from io import BytesIO
+import os
+import sys
+import json
+import hashlib
+import mmap
+from functools import lru_cache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib3.exceptions import HTTPError as Urllib3HTTPError
+from typing import BinaryIO, Dict, Iterable, Iterator, List, NamedTuple, Tuple, Optional, Set
+import io
+from concurrent.futures import ThreadPoolExecutor
+from xml.sax.saxutils import quoteattr
+
+# ISA-L's SIMD inflate/deflate is a drop-in for the gzip module when installed
+try:
+    from isal import igzip as gzip
+    from isal.isal_zlib import error as GzipDataError
+except ImportError:
+    import gzip
+    from zlib import error as GzipDataError
+
+# lxml (libxml2) parses and serializes the EPG much faster; the stdlib
+# ElementTree is API-compatible for everything used here
+try:
+    import lxml.etree as ET
+    HAVE_LXML = True
+except ImportError:
+    import xml.etree.ElementTree as ET
+    HAVE_LXML = False
 
 # Your local playlist file
 PLAYLIST_FILE = "playlist.m3u"
 
+# Sidecar cache of DrewLive playlist and EPG validators (ETag / Last-Modified / digests) from the last run
+PLAYLIST_CACHE_FILE = os.path.join(os.path.dirname(PLAYLIST_FILE), ".playlist_cache.json")
+
 # Your local EPG file
 EPG_FILE = "watchpoint-iptv-playlist.xml.gz"
 
+# Read buffer between the EPG download and gzip/XML parsing (default is 8 KiB)
+EPG_READ_BUFFER_SIZE = 128 * 1024
+
 # DrewLive playlist URL
 DREW_PLAYLIST_URL = "http://drewlive24.duckdns.org:8081/DrewLive/MergedCleanPlaylist.m3u8"
 
 # DrewLive EPG URL (adjust if different)
 DREW_EPG_URL = "http://drewlive24.duckdns.org:8081/DrewLive/DrewLive.xml.gz"
 
+# Set VERBOSE=1 to also log channels skipped for a provider mismatch
+VERBOSE = os.environ.get("VERBOSE") == "1"
+
+# Shared HTTP session so every fetch reuses pooled keep-alive connections
+_SESSION = requests.Session()
+_SESSION.headers.update({"User-Agent": "WatchPoint-IPTV-Updater/1.0", "Accept-Encoding": "gzip"})
+_ADAPTER = HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=10,
+    max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504]),
+)
+_SESSION.mount("http://", _ADAPTER)
+_SESSION.mount("https://", _ADAPTER)
+
+# Precompiled patterns used in the per-line parsing loop
+_TVG_ID_RE = re.compile(r'tvg-id="([^"]+)"')
+
+# Stream URL schemes, as a tuple so startswith checks both in one call
+_URL_PREFIXES = ("http://", "https://")
+
+class Channel(NamedTuple):
+    """A single playlist entry: #EXTINF line, option lines and stream URL"""
+    extinf: str
+    url: str
+    extras: List[str]
+    tvg_id: Optional[str]
+    name: str
+    name_lc: str
+
+    @property
+    def provider(self) -> str:
+        """Provider domain of the stream URL, derived on demand since only matched channels need it"""
+        return extract_provider_domain(self.url)
+
 def extract_provider_domain(url: str) -> str:
     """Extract the main provider domain from a URL"""
-    try:
-        parsed = urlparse(url)
-        hostname = parsed.hostname or ""
-        # Remove port if present
-        hostname = hostname.split(':')[0]
-        
-        # For IP addresses, return as-is
-        if re.match(r'^\d+\.\d+\.\d+\.\d+$', hostname):
-            return hostname
-        
-        # Extract base domain (e.g., 'moveonjoy.com' from 'fl1.moveonjoy.com')
-        # or 'portal5458.com' from 'portal5458.com'
-        parts = hostname.split('.')
-        if len(parts) >= 2:
-            # Get last two parts for most domains (e.g., moveonjoy.com, portal5458.com)
-            return '.'.join(parts[-2:])
-        return hostname
-    except:
+    # Plain string slicing instead of urlparse: only the hostname matters here
+    scheme_end = url.find("://")
+    if scheme_end < 0:
         return ""
-
-def parse_m3u_playlist(lines: List[str]) -> List[Dict]:
-    """Parse M3U playlist into list of channel dictionaries (supports extra option lines)"""
-    channels: List[Dict] = []
-    i = 0
-
-    while i < len(lines):
-        line = lines[i].strip()
-
-        if not line or line == "#EXTM3U":
-            i += 1
-            continue
-
-        if line.startswith("#EXTINF"):
-            tvg_id_match = re.search(r'tvg-id="([^"]+)"', line)
-            tvg_id = tvg_id_match.group(1) if tvg_id_match else None
-
-            name_match = re.search(r',(.+)$', line)
-            channel_name = name_match.group(1).strip() if name_match else ""
-
-            j = i + 1
-            extras: List[str] = []
-            url: Optional[str] = None
-
-            while j < len(lines):
-                candidate = lines[j].strip()
-
-                if candidate.startswith("#EXTINF"):
-                    break
-
-                if candidate.startswith("http://") or candidate.startswith("https://"):
-                    url = candidate
-                    j += 1
-                    break
-
-                extras.append(lines[j])
-                j += 1
-
-            if url:
-                provider = extract_provider_domain(url)
-                channels.append({
-                    "extinf": line,
-                    "url": url,
-                    "extras": extras,
-                    "tvg_id": tvg_id,
-                    "name": channel_name,
-                    "provider": provider,
-                    "original_index": len(channels),
-                })
-            else:
-                print(f"⚠️  Skipping channel (no playable URL found): {channel_name or '[unknown]'}")
-
-            i = j
+    start = scheme_end + 3
+    end = len(url)
+    for sep in "/?#":
+        cut = url.find(sep, start, end)
+        if cut >= 0:
+            end = cut
+    # Many channels share a host, so cache on the authority rather than the URL
+    return _provider_from_authority(url[start:end])
+
+def _is_ipv4(host: str) -> bool:
+    """Check for a dotted-quad IPv4 address with plain character tests"""
+    if host.count(".") != 3:
+        return False
+    return all(part.isascii() and part.isdigit() and len(part) <= 3 and int(part) < 256 for part in host.split("."))
+
+@lru_cache(maxsize=8192)
+def _provider_from_authority(authority: str) -> str:
+    """Reduce a URL authority (userinfo@host:port) to its provider domain"""
+    # Drop credentials and port
+    host = authority.rpartition("@")[2]
+    if host.startswith("["):
+        host = host[1:host.find("]")]
+    else:
+        host = host.partition(":")[0]
+    host = host.lower()
+
+    # For IP addresses, return as-is
+    if _is_ipv4(host):
+        return host
+
+    # Extract base domain (e.g., 'moveonjoy.com' from 'fl1.moveonjoy.com')
+    # or 'portal5458.com' from 'portal5458.com'
+    parts = host.split('.')
+    if len(parts) >= 2:
+        # Get last two parts for most domains (e.g., moveonjoy.com, portal5458.com)
+        return '.'.join(parts[-2:])
+    return host
+
+def parse_m3u_playlist(lines: Iterable[str]) -> List[Channel]:
+    """Parse M3U playlist into list of channels (supports extra option lines)"""
+    channels: List[Channel] = []
+    it = iter(lines)
+    # One-line lookahead: the line after a channel's URL (or the #EXTINF that
+    # ended a URL-less channel) is carried over to the next iteration
+    line = next(it, None)
+
+    while line is not None:
+        # Only #EXTINF lines start a channel; everything else is skipped untouched
+        if not line.startswith("#EXTINF"):
+            line = next(it, None)
             continue
 
-        i += 1
+        extinf = line
+        # A plain substring test is far cheaper than entering the regex engine
+        tvg_id_match = _TVG_ID_RE.search(extinf) if 'tvg-id="' in extinf else None
+        tvg_id = tvg_id_match.group(1) if tvg_id_match else None
+
+        # The name is everything after the first comma (titles may contain commas)
+        sep, _, title = extinf.partition(",")
+        channel_name = title.strip() if sep else ""
+
+        extras: List[str] = []
+        url: Optional[str] = None
+
+        line = next(it, None)
+        while line is not None:
+            candidate = line.strip()
+
+            # The URL is almost always the very next line, so test for it first
+            if candidate.startswith(_URL_PREFIXES):
+                url = candidate
+                line = next(it, None)
+                break
+
+            if candidate.startswith("#EXTINF"):
+                break
+
+            # Blank lines can appear when a streamed \r\n is split across chunks
+            if candidate:
+                extras.append(line)
+            line = next(it, None)
+
+        if url:
+            channels.append(Channel(
+                extinf=extinf,
+                url=url,
+                extras=extras,
+                tvg_id=tvg_id,
+                name=channel_name,
+                name_lc=channel_name.lower(),
+            ))
+        else:
+            print(f"⚠️  Skipping channel (no playable URL found): {channel_name or '[unknown]'}")
 
     return channels
 
-def find_matching_channel(local_channel: Dict, drew_channels: List[Dict]) -> Optional[Dict]:
+def index_channels(channels: List[Channel]) -> Tuple[Dict[str, Channel], Dict[str, Channel]]:
+    """Build tvg-id and lowercased-name lookup tables (first occurrence wins)"""
+    by_tvg_id: Dict[str, Channel] = {}
+    by_name: Dict[str, Channel] = {}
+    for ch in channels:
+        if ch.tvg_id:
+            by_tvg_id.setdefault(ch.tvg_id, ch)
+        if ch.name_lc:
+            by_name.setdefault(ch.name_lc, ch)
+    return by_tvg_id, by_name
+
+def find_matching_channel(local_channel: Channel, by_tvg_id: Dict[str, Channel], by_name: Dict[str, Channel]) -> Optional[Channel]:
     """Find matching channel in DrewLive playlist by tvg-id or name"""
-    # First try to match by tvg-id (most reliable)
-    if local_channel['tvg_id']:
-        for drew_ch in drew_channels:
-            if drew_ch['tvg_id'] == local_channel['tvg_id']:
-                return drew_ch
-    
-    # Fallback to channel name matching (exact match, case-insensitive)
-    if local_channel['name']:
-        local_name = local_channel['name'].strip().lower()
-        for drew_ch in drew_channels:
-            drew_name = drew_ch['name'].strip().lower()
-            if drew_name == local_name:
-                return drew_ch
-    
-    return None
+    # First try to match by tvg-id (most reliable), then fall back to
+    # channel name matching (exact match, case-insensitive)
+    return by_tvg_id.get(local_channel.tvg_id) or by_name.get(local_channel.name_lc)
 
-def should_update_channel(local_channel: Dict, drew_channel: Dict) -> bool:
+def should_update_channel(local_channel: Channel, drew_channel: Channel) -> bool:
     """Determine if channel should be updated - MUST be same provider AND same channel"""
-    # CRITICAL: Only update if provider domain matches exactly
-    if local_channel['provider'] != drew_channel['provider']:
+    # Only update if URL actually changed (checked first: it is the common
+    # case and needs no provider lookup)
+    if local_channel.url == drew_channel.url:
         return False
     
-    # Only update if URL actually changed
-    if local_channel['url'] == drew_channel['url']:
+    # CRITICAL: Only update if provider domain matches exactly
+    if local_channel.provider != drew_channel.provider:
         return False
     
     return True
 
-def update_playlist(local_channels: List[Dict], drew_channels: List[Dict]) -> Tuple[List[str], int]:
-    """Update local playlist with changes from DrewLive, preserving order and NEVER adding new channels"""
-    updated_count = 0
-    output_lines = ["#EXTM3U"]
+def render_playlist(channels: Iterable[Channel]) -> Iterator[str]:
+    """Render channels back into M3U playlist lines, lazily"""
+    yield "#EXTM3U"
+    for ch in channels:
+        yield ch.extinf
+        yield from ch.extras
+        yield ch.url
 
-    for local_ch in local_channels:
-        drew_ch = find_matching_channel(local_ch, drew_channels)
+def update_playlist(local_channels: List[Channel], drew_channels: List[Channel]) -> Tuple[Optional[Iterator[str]], int]:
+    """Update local playlist with changes from DrewLive, preserving order and NEVER adding new channels
+
+    Returns (None, 0) without rendering anything when no channel changed.
+    """
+    edits: List[Tuple[int, Channel]] = []
+    # Collected and written in one go after the loop instead of a print per line
+    log_lines: List[str] = []
+    by_tvg_id, by_name = index_channels(drew_channels)
+
+    for index, local_ch in enumerate(local_channels):
+        drew_ch = find_matching_channel(local_ch, by_tvg_id, by_name)
 
         if drew_ch and should_update_channel(local_ch, drew_ch):
-            output_lines.append(drew_ch["extinf"])
-            for extra in (local_ch.get("extras") or drew_ch.get("extras") or []):
-                output_lines.append(extra)
-            output_lines.append(drew_ch["url"])
-            updated_count += 1
-            print(f"✅ Updated: {local_ch['name']} ({local_ch['provider']})")
-            print(f"   Old: {local_ch['url']}")
-            print(f"   New: {drew_ch['url']}")
-        else:
-            output_lines.append(local_ch["extinf"])
-            for extra in local_ch.get("extras", []):
-                output_lines.append(extra)
-            output_lines.append(local_ch["url"])
-
-            if drew_ch:
-                if local_ch["provider"] != drew_ch["provider"]:
-                    print(f"⚠️  Skipped: {local_ch['name']} - Provider mismatch")
-                    print(f"   Local: {local_ch['provider']} | DrewLive: {drew_ch['provider']}")
-            # No log when the URL is unchanged or the channel is missing upstream
-
-    return output_lines, updated_count
-
-def fetch_drew_playlist():
-    """Fetch DrewLive playlist from GitHub"""
-    response = requests.get(DREW_PLAYLIST_URL, timeout=15)
-    response.raise_for_status()
-    return response.text.splitlines()
-
-def load_local_playlist():
-    """Load local playlist file"""
-    with open(PLAYLIST_FILE, "r", encoding="utf-8") as f:
-        return f.read().splitlines()
-
-def save_playlist(lines: List[str]):
+            edits.append((index, drew_ch._replace(extras=local_ch.extras or drew_ch.extras)))
+            log_lines.append(f"✅ Updated: {local_ch.name} ({local_ch.provider})")
+            log_lines.append(f"   Old: {local_ch.url}")
+            log_lines.append(f"   New: {drew_ch.url}")
+        elif VERBOSE and drew_ch and local_ch.provider != drew_ch.provider:
+            log_lines.append(f"⚠️  Skipped: {local_ch.name} - Provider mismatch")
+            log_lines.append(f"   Local: {local_ch.provider} | DrewLive: {drew_ch.provider}")
+        # No log when the URL is unchanged or the channel is missing upstream
+
+    if log_lines:
+        sys.stdout.write("\n".join(log_lines) + "\n")
+
+    if not edits:
+        return None, 0
+
+    # Only copy the channel list once we know something actually changed
+    updated_channels = local_channels.copy()
+    for index, new_ch in edits:
+        updated_channels[index] = new_ch
+    return render_playlist(updated_channels), len(edits)
+
+def fetch_drew_playlist(cache: Dict[str, str]) -> Optional[Iterator[str]]:
+    """Fetch DrewLive playlist lines, or None if unchanged since the cached validators"""
+    headers = {}
+    if cache.get("etag"):
+        headers["If-None-Match"] = cache["etag"]
+    if cache.get("last_modified"):
+        headers["If-Modified-Since"] = cache["last_modified"]
+
+    response = _SESSION.get(DREW_PLAYLIST_URL, headers=headers, stream=True, timeout=20)
+    if response.status_code == 304:
+        response.close()
+        return None
+    try:
+        response.raise_for_status()
+    except requests.HTTPError:
+        response.close()
+        raise
+
+    cache["etag"] = response.headers.get("ETag", "")
+    cache["last_modified"] = response.headers.get("Last-Modified", "")
+
+    # Servers without validators still let us skip the parse when the body is
+    # byte-identical to last run's; lines are decoded lazily from this buffer
+    body_digest = hashlib.blake2b(response.content, digest_size=16).hexdigest()
+    if cache.get("body_digest") == body_digest:
+        response.close()
+        return None
+    cache["body_digest"] = body_digest
+
+    # M3U8 is UTF-8 by definition; skip charset sniffing on the stream
+    response.encoding = "utf-8"
+    return _iter_response_lines(response)
+
+def _iter_response_lines(response: requests.Response) -> Iterator[str]:
+    """Yield decoded lines from a response, closing it when exhausted"""
+    with response:
+        yield from response.iter_lines(chunk_size=65536, decode_unicode=True)
+
+def load_playlist_cache() -> Dict[str, str]:
+    """Load the sidecar cache, or an empty one if missing or unreadable"""
+    try:
+        with open(PLAYLIST_CACHE_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_playlist_cache(cache: Dict[str, str]):
+    """Save the sidecar cache"""
+    with open(PLAYLIST_CACHE_FILE, "w", encoding="utf-8") as f:
+        json.dump(cache, f)
+
+def file_digest(path: str) -> str:
+    """BLAKE2b digest of a file's bytes ("" if it does not exist)"""
+    digest = hashlib.blake2b(digest_size=16)
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 16), b""):
+                digest.update(chunk)
+    except FileNotFoundError:
+        return ""
+    return digest.hexdigest()
+
+def load_local_playlist() -> Iterator[str]:
+    """Stream local playlist lines from a read-only memory map of the file"""
+    with open(PLAYLIST_FILE, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return  # mmap cannot map an empty file
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for raw_line in iter(mm.readline, b""):
+                yield raw_line.decode("utf-8").rstrip("\r\n")
+
+def load_local_channels() -> List[Channel]:
+    """Load and parse the local playlist"""
+    return parse_m3u_playlist(load_local_playlist())
+
+def fetch_drew_channels(cache: Dict[str, str]) -> Optional[List[Channel]]:
+    """Fetch and parse the DrewLive playlist, or None if it has not changed"""
+    drew_lines = fetch_drew_playlist(cache)
+    if drew_lines is None:
+        return None
+    return parse_m3u_playlist(drew_lines)
+
+def save_playlist(lines: Iterable[str]):
     """Save playlist to file"""
-    if not lines or len(lines) <= 1:  # Only header
+    # Stream the lines through a large buffer into a temp file, then swap it in
+    # atomically so a killed run can never leave a half-written playlist
+    tmp_file = PLAYLIST_FILE + ".tmp"
+    line_count = 0
+    try:
+        with open(tmp_file, "wb", buffering=1 << 20) as f:
+            for line in lines:
+                f.write(line.encode("utf-8") + b"\n")
+                line_count += 1
+            f.flush()
+            os.fsync(f.fileno())
+    except Exception:
+        try:
+            os.remove(tmp_file)
+        except FileNotFoundError:
+            pass
+        raise
+
+    if line_count <= 1:  # Only header
+        os.remove(tmp_file)
         print("⚠️ Playlist is empty! Skipping overwrite.")
         return
-    
-    with open(PLAYLIST_FILE, "w", encoding="utf-8") as f:
-        f.write("\n".join(lines) + "\n")
-    print(f"✅ Playlist saved. {len(lines)} lines written.")
 
-def get_local_channel_ids(local_channels: List[Dict]) -> Set[str]:
+    os.replace(tmp_file, PLAYLIST_FILE)
+    print(f"✅ Playlist saved. {line_count} lines written.")
+
+def get_local_channel_ids(local_channels: List[Channel]) -> Set[str]:
     """Extract set of tvg-ids from local playlist channels"""
     channel_ids = set()
     for ch in local_channels:
-        if ch['tvg_id']:
-            channel_ids.add(ch['tvg_id'])
+        if ch.tvg_id:
+            channel_ids.add(ch.tvg_id)
     return channel_ids
 
-def fetch_drew_epg() -> Optional[bytes]:
-    """Fetch DrewLive EPG from GitHub"""
+def fetch_drew_epg(cache: Dict[str, str]) -> Optional[requests.Response]:
+    """Open a streaming response for the DrewLive EPG (status 304 if unchanged since the cached validators)"""
+    headers = {}
+    # The validators are only worth sending while last run's output is still there
+    if os.path.exists(EPG_FILE):
+        if cache.get("epg_etag"):
+            headers["If-None-Match"] = cache["epg_etag"]
+        if cache.get("epg_last_modified"):
+            headers["If-Modified-Since"] = cache["epg_last_modified"]
+
     try:
-        response = requests.get(DREW_EPG_URL, timeout=30, stream=True)
+        response = _SESSION.get(DREW_EPG_URL, headers=headers, timeout=30, stream=True)
+        if response.status_code == 304:
+            return response
         response.raise_for_status()
-        return response.content
+        # Undo any transport Content-Encoding; the .gz file itself is
+        # decompressed by open_epg_stream
+        response.raw.decode_content = True
+        return response
     except Exception as e:
         print(f"⚠️  Error fetching DrewLive EPG: {e}")
         return None
 
-def parse_xmltv_epg(epg_data: bytes) -> Tuple[ET.Element, Dict[str, ET.Element]]:
-    """Parse XMLTV EPG data and return root element and channel dictionary"""
+def open_epg_stream(response: requests.Response) -> BinaryIO:
+    """Wrap the EPG response body in a file object, gunzipping on the fly if needed"""
+    # Keep urllib3 from reporting the body closed once it is fully buffered,
+    # which would make BufferedReader refuse to hand out what it already read
+    response.raw.auto_close = False
+    stream = io.BufferedReader(response.raw, buffer_size=EPG_READ_BUFFER_SIZE)
+    # Decompress if gzipped
+    if stream.peek(2)[:2] == b"\x1f\x8b":
+        return gzip.GzipFile(fileobj=stream, mode='rb')
+    return stream
+
+def iterparse_epg(source):
+    """Incrementally parse XMLTV from a file-like object, yielding (event, element)"""
+    if HAVE_LXML:
+        return ET.iterparse(source, events=('start', 'end'), huge_tree=True, collect_ids=False)
+    return ET.iterparse(source, events=('start', 'end'))
+
+def filter_xmltv_epg(source: BinaryIO, channel_ids: Set[str]) -> Tuple[Dict[str, str], List[ET.Element], int]:
+    """Stream-parse XMLTV EPG data, keeping only channels (and their programmes) in channel_ids
+
+    Returns the root attributes, the kept elements in document order and the
+    number of channels seen in the source.
+    """
     try:
-        # Decompress if gzipped
-        try:
-            decompressed = gzip.decompress(epg_data)
-        except:
-            decompressed = epg_data
-        
-        # Parse XML
-        root = ET.fromstring(decompressed)
-        
-        # Build channel dictionary: channel_id -> channel_element
-        channels_dict = {}
-        for channel in root.findall('.//channel'):
-            channel_id = channel.get('id')
-            if channel_id:
-                channels_dict[channel_id] = channel
-        
-        return root, channels_dict
+        attrib: Dict[str, str] = {}
+        kept: List[ET.Element] = []
+        root = None
+        total_channels = 0
+        kept_channel_ids = set()
+        kept_programmes = 0
+
+        for event, elem in iterparse_epg(source):
+            if event == 'start':
+                if root is None:
+                    # Copy attributes from original root
+                    root = elem
+                    attrib = dict(root.attrib)
+                continue
+
+            if elem.tag == 'channel':
+                total_channels += 1
+                channel_id = elem.get('id')
+                if channel_id in channel_ids and channel_id not in kept_channel_ids:
+                    kept.append(elem)
+                    kept_channel_ids.add(channel_id)
+                    print(f"📺 Keeping EPG for: {channel_id}")
+            elif elem.tag == 'programme':
+                # XMLTV puts every <channel> before the first <programme>, so
+                # kept_channel_ids is already complete here
+                if elem.get('channel') in kept_channel_ids:
+                    kept.append(elem)
+                    kept_programmes += 1
+            else:
+                continue
+
+            # Drop everything parsed so far from the source tree so memory stays
+            # bounded by the kept elements, not the whole EPG; those live on
+            # through the references in kept, without being re-parented
+            root.clear()
+
+        print(f"✅ Filtered EPG: {len(kept_channel_ids)} channels, {kept_programmes} programmes")
+        return attrib, kept, total_channels
     except Exception as e:
         print(f"❌ Error parsing EPG XML: {e}")
         raise
 
-def filter_epg_by_channels(epg_root: ET.Element, channel_ids: Set[str], channels_dict: Dict[str, ET.Element]) -> ET.Element:
-    """Filter EPG to only include channels that exist in local playlist"""
-    # Create new root element
-    new_root = ET.Element('tv')
-    
-    # Copy attributes from original root
-    for key, value in epg_root.attrib.items():
-        new_root.set(key, value)
-    
-    # Filter channels - only keep channels with matching tvg-ids
-    kept_channel_ids = set()
-    for channel_id in channel_ids:
-        if channel_id in channels_dict:
-            new_root.append(channels_dict[channel_id])
-            kept_channel_ids.add(channel_id)
-            print(f"📺 Keeping EPG for: {channel_id}")
-    
-    # Filter programmes - only keep programmes for channels we kept
-    for programme in epg_root.findall('.//programme'):
-        channel_ref = programme.get('channel')
-        if channel_ref in kept_channel_ids:
-            new_root.append(programme)
-    
-    print(f"✅ Filtered EPG: {len(kept_channel_ids)} channels, {len(new_root.findall('.//programme'))} programmes")
-    return new_root
+# Whitespace that must be escaped to survive attribute-value normalization
+_ATTR_WHITESPACE = {"\n": "&#10;", "\r": "&#13;", "\t": "&#9;"}
+
+def write_xmltv(out: BinaryIO, attrib: Dict[str, str], elements: Iterable[ET.Element]):
+    """Serialize a <tv> document element by element instead of as one big string"""
+    if HAVE_LXML:
+        with ET.xmlfile(out, encoding='utf-8') as xf:
+            xf.write_declaration()
+            with xf.element('tv', dict(attrib)):
+                for elem in elements:
+                    xf.write(elem)
+        return
+
+    # The stdlib has no incremental writer, so emit the root tags by hand and
+    # serialize each child straight into the stream
+    out.write(b"<?xml version='1.0' encoding='utf-8'?>\n")
+    attrs = "".join(f" {key}={quoteattr(value, _ATTR_WHITESPACE)}" for key, value in attrib.items())
+    out.write(f"<tv{attrs}>".encode('utf-8'))
+    for elem in elements:
+        ET.ElementTree(elem).write(out, encoding='utf-8', xml_declaration=False)
+    out.write(b"</tv>\n")
 
-def save_epg(epg_root: ET.Element):
+def save_epg(attrib: Dict[str, str], elements: Iterable[ET.Element]):
     """Save filtered EPG to compressed XML file"""
+    # Written to a temp file and swapped in atomically: the file is kept
+    # across runs while upstream answers 304, so a half-written one would stick
+    tmp_file = EPG_FILE + ".tmp"
     try:
-        # Convert XML tree to string
-        xml_string = ET.tostring(epg_root, encoding='utf-8', xml_declaration=True)
-        
-        # Compress and save
-        with gzip.open(EPG_FILE, 'wb') as f:
-            f.write(xml_string)
+        # Serialize straight into the gzip stream; level 1 is several times
+        # faster than the default 9 for a slightly larger file
+        with open(tmp_file, 'wb', buffering=1 << 20) as raw:
+            with gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=1) as f:
+                write_xmltv(f, attrib, elements)
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(tmp_file, EPG_FILE)
         
         print(f"✅ EPG saved to {EPG_FILE}")
     except Exception as e:
         print(f"❌ Error saving EPG: {e}")
+        try:
+            os.remove(tmp_file)
+        except FileNotFoundError:
+            pass
         raise
 
-def update_epg(local_channels: List[Dict]) -> bool:
-    """Update EPG file by filtering DrewLive EPG to match local playlist channels"""
-    print("\n📥 Fetching DrewLive EPG...")
-    epg_data = fetch_drew_epg()
+def update_epg(local_channels: List[Channel], response: Optional[requests.Response], cache: Dict[str, str]) -> bool:
+    """Update EPG file by filtering the DrewLive EPG response to match local playlist channels"""
+    print("\n📥 Streaming DrewLive EPG...")
     
-    if not epg_data:
+    if response is None:
         print("⚠️  Could not fetch DrewLive EPG. Skipping EPG update.")
         return False
     
-    print("📺 Parsing EPG data...")
-    epg_root, channels_dict = parse_xmltv_epg(epg_data)
-    
-    print(f"📊 Found {len(channels_dict)} channels in DrewLive EPG")
-    
     # Get channel IDs from local playlist
     local_channel_ids = get_local_channel_ids(local_channels)
     print(f"📊 Local playlist has {len(local_channel_ids)} channels with tvg-id")
+    ids_digest = hashlib.blake2b("\n".join(sorted(local_channel_ids)).encode("utf-8"), digest_size=16).hexdigest()
+
+    if response.status_code == 304:
+        response.close()
+        if cache.get("epg_ids_digest") == ids_digest:
+            print(f"✅ No remote change in DrewLive EPG since last run - keeping {EPG_FILE}")
+            return True
+        # Same upstream EPG, but the playlist's channels changed since it was
+        # last filtered, so the full body is needed after all
+        response = fetch_drew_epg({})
+        if response is None:
+            print("⚠️  Could not fetch DrewLive EPG. Skipping EPG update.")
+            return False
     
-    # Filter EPG to only include local channels
-    print("\n🔄 Filtering EPG to match local playlist...")
-    filtered_epg = filter_epg_by_channels(epg_root, local_channel_ids, channels_dict)
+    # Parse and filter in one streaming pass to only include local channels
+    print("\n🔄 Parsing and filtering EPG to match local playlist...")
+    # Network -> gunzip -> parser, without holding the download in memory.
+    # The body is only read here, so a truncated, corrupt or empty download
+    # surfaces now (raw-stream reads raise urllib3's errors, not requests')
+    try:
+        with response:
+            epg_attrib, epg_elements, total_channels = filter_xmltv_epg(open_epg_stream(response), local_channel_ids)
+    except (requests.RequestException, Urllib3HTTPError, OSError, EOFError, GzipDataError, ET.ParseError) as e:
+        print(f"⚠️  Error fetching DrewLive EPG: {e}")
+        print("⚠️  Could not fetch DrewLive EPG. Skipping EPG update.")
+        return False
+    print(f"📊 Found {total_channels} channels in DrewLive EPG")
     
     # Save filtered EPG
     print("\n💾 Saving filtered EPG...")
-    save_epg(filtered_epg)
+    save_epg(epg_attrib, epg_elements)
+
+    # Only remember the validators once the output they describe is on disk
+    cache["epg_etag"] = response.headers.get("ETag", "")
+    cache["epg_last_modified"] = response.headers.get("Last-Modified", "")
+    cache["epg_ids_digest"] = ids_digest
     
     return True
 
@@ -296,37 +566,52 @@ def main():
     print("=" * 60)
     print("📺 PLAYLIST UPDATE")
     print("=" * 60)
-    print("📥 Fetching DrewLive playlist...")
-    drew_lines = fetch_drew_playlist()
-    drew_channels = parse_m3u_playlist(drew_lines)
-    print(f"📺 Found {len(drew_channels)} channels in DrewLive playlist")
-    
-    print("📥 Loading local playlist...")
-    local_lines = load_local_playlist()
-    local_channels = parse_m3u_playlist(local_lines)
+    # The cached validators only hold if the local playlist is still the one
+    # written by the last run; otherwise edits to it must be re-merged
+    cache = load_playlist_cache()
+    if cache.get("local_digest") != file_digest(PLAYLIST_FILE):
+        cache = {}
+
+    # The local read and the DrewLive downloads are independent, so the local
+    # parse runs while the requests are still waiting on the network; the EPG
+    # request is opened now and its body streamed later in update_epg
+    print("📥 Loading local playlist and fetching DrewLive playlist and EPG...")
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        epg_future = executor.submit(fetch_drew_epg, cache)
+        local_future = executor.submit(load_local_channels)
+        drew_future = executor.submit(fetch_drew_channels, cache)
+        local_channels = local_future.result()
+        drew_channels = drew_future.result()
     print(f"📺 Found {len(local_channels)} channels in local playlist")
-    
-    print("\n🔄 Checking for updates (ALL providers)...")
-    print("   Rules: Same provider + Same channel + URL changed = Update")
-    print("   Rules: Different provider = Keep original")
-    print("   Rules: Channel not in DrewLive = Keep original")
-    print("   Rules: NO new channels will be added\n")
-    
-    updated_lines, updated_count = update_playlist(local_channels, drew_channels)
-    
-    if updated_count > 0:
-        print(f"\n✨ Updated {updated_count} channel(s)")
-        save_playlist(updated_lines)
+
+    if drew_channels is None:
+        print("\n✅ No remote change in DrewLive playlist since last run - skipping playlist update")
     else:
-        print("\n✅ No playlist updates needed - all channels are up to date!")
-        # Still save to ensure file format is consistent
-        save_playlist(updated_lines)
+        print(f"📺 Found {len(drew_channels)} channels in DrewLive playlist")
+
+        print("\n🔄 Checking for updates (ALL providers)...")
+        print("   Rules: Same provider + Same channel + URL changed = Update")
+        print("   Rules: Different provider = Keep original")
+        print("   Rules: Channel not in DrewLive = Keep original")
+        print("   Rules: NO new channels will be added\n")
+
+        updated_lines, updated_count = update_playlist(local_channels, drew_channels)
+
+        if updated_count > 0:
+            print(f"\n✨ Updated {updated_count} channel(s)")
+            save_playlist(updated_lines)
+        else:
+            # Leave the file untouched so there is nothing for git to pick up
+            print("\n✅ No playlist updates needed - all channels are up to date!")
+
+        cache["local_digest"] = file_digest(PLAYLIST_FILE)
     
     # Update EPG
     print("\n" + "=" * 60)
     print("📺 EPG UPDATE")
     print("=" * 60)
-    epg_updated = update_epg(local_channels)
+    epg_updated = update_epg(local_channels, epg_future.result(), cache)
+    save_playlist_cache(cache)
     
     if epg_updated:
         print("\n✅ EPG update completed successfully!")